@@ -1,20 +1,35 @@
-import glob
+import argparse
+import html
+import io
+import itertools
 import os
 import sys
 import logging
 import concurrent.futures
-import base64
-import random
+import shutil
 import time
 import subprocess
 import multiprocessing
+import threading
+from collections import OrderedDict, defaultdict
 from datetime import datetime
+from string import Template
+from urllib.parse import quote, urlparse
 import openpyxl
 import requests
-from openpyxl.drawing.image import Image as ExcelImage
+import xlsxwriter
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from urllib3.util.retry import Retry
+from openpyxl.utils import get_column_letter
 from PIL import Image as PILImage
 from tqdm import tqdm
 
+try:
+    import pyvips  # opcional: libvips redimensiona más rápido y con menos memoria que Pillow
+except (ImportError, OSError):
+    pyvips = None
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,21 +40,102 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-COLUMN_MAP = {
-    '24': 'Y',
-    '25': 'Z',
-    '26': 'AA', 
-    '27': 'AB',
-    '28': 'AC',
-    '29': 'AD',
+# Columnas (índice base 0) con URLs de imágenes y su letra en Excel, calculada una sola vez
+IMAGE_COLUMNS = range(24, 30)
+IMAGE_COLUMN_LETTERS = {col: get_column_letter(col + 1) for col in IMAGE_COLUMNS}
+
+# A partir de este número de filas, los Excel de salida se escriben en modo streaming (memoria constante)
+STREAMING_ROWS_THRESHOLD = 10000
+
+# Formatos de imagen que xlsxwriter puede incrustar directamente
+EXCEL_IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'BMP'}
+
+# Bytes mágicos de los formatos de imagen aceptados y la extensión con la que se guardan
+IMAGE_SIGNATURES = {
+    b'\xff\xd8\xff': 'jpg',
+    b'\x89PNG': 'png',
+    b'GIF8': 'gif',
+    b'BM': 'bmp',
 }
 
-# Configuración de directorios
-DOWNLOAD_DIR = 'downloads'
-PROCESSED_DIR = 'processed'
-# Calcular número máximo de hilos basado en CPUs disponibles
-MAX_WORKERS = min((multiprocessing.cpu_count() * 2) + 4, 32)
-logger.info(f"🖥️ Número de hilos configurados: {MAX_WORKERS}")
+# Columnas que no se muestran en el informe HTML
+EXCLUDED_COLUMNS = {'Conca-1', 'Total Horas', 'Recorridospedestres', 'Recuento de Combinada'}
+# Campos que ocupan todo el ancho en el informe HTML
+FULL_WIDTH_FIELDS = {'ObservacionesHallazgo'}
+
+# Concurrencia de red: descargas simultáneas en total y como máximo por host (tamaño del pool de cada host)
+NET_WORKERS = 64
+# Las imágenes de un libro suelen venir todas del mismo host: el límite por host debe dejar a ese
+# host tanta concurrencia como antes (hasta 32 descargas) y reservar el resto para otros hosts
+PER_HOST_WORKERS = NET_WORKERS // 2
+# Concurrencia de CPU (redimensionados simultáneos), basada en CPUs disponibles
+CPU_WORKERS = multiprocessing.cpu_count()
+logger.info(f"🖥️ Hilos de descarga configurados: {NET_WORKERS} ({PER_HOST_WORKERS} por host) - Redimensionados simultáneos: {CPU_WORKERS}")
+
+# Espera máxima (segundos) que se acepta de una cabecera Retry-After antes de reintentar
+MAX_RETRY_AFTER = 30
+
+class CappedRetry(Retry):
+    """Retry que no reintenta si Retry-After pide esperar más de MAX_RETRY_AFTER: un valor como 3600
+    no bloquea el hilo (ni el cupo de su host); la respuesta se devuelve y el host queda bloqueado"""
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                # Con raise_on_status=False, urllib3 devuelve la respuesta al recibir MaxRetryError
+                raise MaxRetryError(_pool, url, ResponseError(f"Retry-After de {retry_after:.0f} s"))
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+# Sesión HTTP compartida: reutiliza conexiones entre descargas y reintenta solo errores transitorios
+# (conexión, lectura y códigos 429/5xx, respetando Retry-After hasta un límite); 4xx, SSL, etc. fallan de inmediato
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=PER_HOST_WORKERS,
+    max_retries=CappedRetry(
+        total=3,
+        other=0,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True,
+        # Al agotar los reintentos se devuelve la última respuesta para registrar su código (p. ej. 429)
+        raise_on_status=False,
+    )
+)
+SESSION.mount('http://', _adapter)
+SESSION.mount('https://', _adapter)
+SESSION.headers.update({'Accept-Encoding': 'gzip, deflate', 'User-Agent': 'CronogramaBot/1.0'})
+# Adaptador del precalentamiento: comparte el pool de conexiones de SESSION pero no reintenta ni espera
+_warm_up_adapter = HTTPAdapter(max_retries=0)
+_warm_up_adapter.poolmanager = _adapter.poolmanager
+# Hosts (esquema, host) ya precalentados en esta ejecución
+_warm_hosts = set()
+
+# Pool de hilos de descarga compartido por todas las coberturas: los hilos (y sus conexiones
+# abiertas en SESSION) se reutilizan en lugar de crearse de nuevo en cada cobertura
+DOWNLOAD_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=NET_WORKERS, thread_name_prefix='descarga')
+# Limita cuántos hilos de descarga redimensionan a la vez para no saturar la CPU
+RESIZE_SEMAPHORE = threading.Semaphore(CPU_WORKERS)
+# Un semáforo por host para no saturar un mismo servidor con todas las descargas
+_host_semaphores = defaultdict(lambda: threading.Semaphore(PER_HOST_WORKERS))
+_host_semaphores_lock = threading.Lock()
+# Por host que respondió 429: momento (time.monotonic) hasta el que no se le envían más peticiones
+_host_blocked_until = {}
+
+# Momento (time.monotonic) de la última respuesta HTTP 429 recibida; None si el servidor no ha limitado
+_last_throttled_at = None
+# Tiempo durante el cual se considera que el servidor sigue limitando las peticiones
+THROTTLE_WINDOW = 60
+
+# Caché LRU por URL, compartida entre coberturas y archivos: ruta del archivo original y miniatura redimensionada
+URL_CACHE = OrderedDict()
+URL_CACHE_MAX_BYTES = 256 * 1024 * 1024  # límite de bytes de miniaturas en caché
+_url_cache_bytes = 0
+_url_cache_lock = threading.Lock()
+
+# Hoja de estilos de los informes HTML, cargada una sola vez al importar el módulo
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report.css'), encoding='utf-8') as _css_file:
+    _CSS = _css_file.read()
 
 def setup_folders():
     """Crea las carpetas necesarias para el procesamiento"""
@@ -50,94 +146,221 @@ def setup_folders():
     html_folder = os.path.join(main_folder, "hallazgos html")
     
     # Crear la estructura de carpetas
-    folders = [main_folder, excel_folder, html_folder, DOWNLOAD_DIR, PROCESSED_DIR, 'temp_images']
+    folders = [main_folder, excel_folder, html_folder, 'temp_images']
     for folder in folders:
         os.makedirs(folder, exist_ok=True)
     
     return excel_folder, html_folder
 
-def process_images():
-    """Redimensiona imágenes a 300x300 píxeles"""
-    images = glob.glob(f'{DOWNLOAD_DIR}/*')
-    logger.info(f"Procesando {len(images)} imágenes")
+def resize_image(path):
+    """Redimensiona una imagen a un máximo de 300x300 píxeles y devuelve sus bytes en JPEG"""
+    img = PILImage.open(path)  # solo lee la cabecera; los píxeles se decodifican al usarlos
+    # Imágenes ya pequeñas en un formato que Excel admite: usar el archivo tal cual, sin decodificar.
+    # Solo si no declaran otra resolución: xlsxwriter escala por 96/dpi (a 72 dpi, 300 px ocuparían 400)
+    dpi = img.info.get('dpi')
+    if (img.width <= 300 and img.height <= 300 and img.format in EXCEL_IMAGE_FORMATS
+            and (dpi is None or all(round(d) in (0, 96) for d in dpi))):
+        img.close()
+        with open(path, 'rb') as f:
+            return f.read()
     
-    with tqdm(total=len(images), desc="Procesando imágenes") as pbar:
-        for path in images:
-            try:
-                img = PILImage.open(path)
-                new_img = img.resize((300, 300))
-                new_img.save(f'{PROCESSED_DIR}/{os.path.basename(path)}')
-            except Exception as e:
-                logger.error(f'Error procesando imagen {path}: {str(e)}')
-            pbar.update(1)
+    if pyvips is not None:
+        img.close()
+        # libvips decodifica reducido al cargar (shrink-on-load) y redimensiona en una sola pasada
+        thumb = pyvips.Image.thumbnail(path, 300, height=300)
+        # libvips conserva la resolución del original; fijarla en 96 dpi (en píxeles por mm) para que
+        # xlsxwriter no reescale la miniatura
+        thumb = thumb.copy(xres=96 / 25.4, yres=96 / 25.4)
+        if thumb.hasalpha():
+            # JPEG no admite transparencia: componer sobre fondo blanco en lugar de negro
+            thumb = thumb.flatten(background=[255] * (thumb.bands - 1))
+        return thumb.write_to_buffer('.jpg', Q=80)
+    
+    # En JPEG, draft decodifica directamente a menor resolución (escalado en el dominio DCT)
+    img.draft('RGB', (600, 600))
+    # En el resto de formatos, thumbnail reduce primero por un factor entero (Image.reduce)
+    # hasta quedar en al menos 600x600 y solo después aplica el remuestreo bilineal
+    img.thumbnail((300, 300), PILImage.Resampling.BILINEAR, reducing_gap=2.0)
+    # Las miniaturas se guardan siempre como JPEG: más ligeras que PNG y compatibles con Excel
+    if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        # JPEG no admite transparencia: componer sobre fondo blanco en lugar de dejarla negra
+        img = img.convert('RGBA')
+        background = PILImage.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    elif img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
 
-def empty_folder(folder_name):
-    """Vacía el contenido de una carpeta"""
-    files = glob.glob(f'{folder_name}/*')
-    for file in files:
-        try:
-            os.remove(file)
-        except Exception as e:
-            logger.error(f'Error eliminando {file}: {str(e)}')
-
-def download_image(url, row, col):
-    """Descarga una única imagen desde una URL con reintentos y timeouts progresivos."""
-    max_retries = 3
-    base_timeout = 10  # timeout base en segundos
-    timeout_multiplier = 1.5  # multiplicador para cada reintento
+def sniff_image_extension(header):
+    """Devuelve la extensión según los bytes mágicos del inicio del archivo, o None si no es una imagen reconocida"""
+    for signature, extension in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def download_image(url, row, col, dest_dir):
+    """Descarga una única imagen a disco en bloques usando la sesión compartida (los reintentos los gestiona el adaptador)."""
+    global _last_throttled_at
+    timeout = 15  # timeout en segundos por intento
     
-    for attempt in range(max_retries):
-        try:
-            current_timeout = base_timeout * (timeout_multiplier ** attempt)
-            response = requests.get(url, timeout=current_timeout)
-            
+    try:
+        # stream=True: se revisan las cabeceras antes de descargar el cuerpo; el bloque with
+        # devuelve la conexión al pool incluso cuando se descarta la respuesta
+        with SESSION.get(url, timeout=timeout, stream=True) as response:
             if not response.ok:
+                if response.status_code == 429:
+                    _last_throttled_at = time.monotonic()
+                    _block_host(url, _adapter.max_retries.get_retry_after(response.raw))
                 logger.error(f"ERROR CON IMAGEN {row=} {col=} {url} - Código de estado: {response.status_code}")
-                if attempt == max_retries - 1:
-                    return False, None
-                continue
+                return False, None
                 
             content_type = response.headers.get('content-type', '')
             if not content_type.startswith('image/'):
                 logger.warning(f"NO ES UNA IMAGEN {row=} {col=} {url} - Tipo de contenido: {content_type}")
                 return False, None
-                
-            extension = content_type.split('/')[-1].split(';')[0]
-            if not extension:
-                extension = 'jpg'  # Extensión por defecto si no se puede determinar
-                
-            path = f'{DOWNLOAD_DIR}/{row}_{col}.{extension}'
             
-            with open(path, 'wb+') as f:
-                f.write(response.content)
+            # La extensión se obtiene del contenido real y no del Content-Type (p. ej. svg+xml, octet-stream)
+            chunks = response.iter_content(chunk_size=64 * 1024)
+            # Con Transfer-Encoding: chunked el primer bloque puede ser más corto que la firma: acumular hasta 12 bytes
+            head = b''
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= 12:
+                    break
+            extension = sniff_image_extension(head[:12])
+            if extension is None:
+                logger.warning(f"FORMATO DE IMAGEN NO RECONOCIDO {row=} {col=} {url} - Tipo de contenido: {content_type}")
+                return False, None
             
-            # Convertir a base64 y almacenar en memoria
-            img_base64 = base64.b64encode(response.content).decode('utf-8')
-                
-            logger.debug(f"Imagen descargada exitosamente: {path}")
-            return True, img_base64
+            # Escribir el cuerpo por bloques: la memoria por descarga queda acotada al tamaño del bloque
+            path = os.path.join(dest_dir, f'{row}_{col}.{extension}')
+            try:
+                with open(path, 'wb') as f:
+                    f.write(head)
+                    for chunk in chunks:
+                        f.write(chunk)
+            except Exception:
+                # No dejar archivos a medio escribir
+                if os.path.exists(path):
+                    os.remove(path)
+                raise
             
-        except requests.exceptions.Timeout:
-            logger.warning(f"Timeout al descargar imagen {row=} {col=} {url} (Intento {attempt + 1}/{max_retries})")
-            if attempt == max_retries - 1:
-                logger.error(f"Se agotaron los reintentos para la imagen {row=} {col=} {url}")
-                return False, None
-            continue
+        logger.debug(f"Imagen descargada exitosamente: {path}")
+        return True, path
+        
+    except requests.exceptions.Timeout:
+        logger.error(f"Timeout al descargar imagen {row=} {col=} {url}")
+        return False, None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error de red al descargar imagen {row=} {col=} {url}: {str(e)}")
+        return False, None
+    except Exception as e:
+        logger.error(f"Error inesperado al descargar imagen {row=} {col=} {url}: {str(e)}")
+        return False, None
+
+def _host_semaphore(url):
+    """Devuelve el semáforo que limita las descargas simultáneas al host de la URL"""
+    with _host_semaphores_lock:
+        return _host_semaphores[urlparse(url).netloc]
+
+def _block_host(url, retry_after):
+    """Bloquea el host de la URL durante retry_after segundos (MAX_RETRY_AFTER si el servidor no lo indica)"""
+    until = time.monotonic() + (MAX_RETRY_AFTER if retry_after is None else retry_after)
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        _host_blocked_until[host] = max(until, _host_blocked_until.get(host, 0))
+
+def _host_wait(url):
+    """Devuelve los segundos que faltan para que termine el bloqueo del host de la URL (0 si no está bloqueado)"""
+    with _host_semaphores_lock:
+        until = _host_blocked_until.get(urlparse(url).netloc, 0)
+    return max(0, until - time.monotonic())
+
+def _cache_get(url):
+    """Devuelve (ruta_original, miniatura) de una URL ya procesada, o None"""
+    with _url_cache_lock:
+        cached = URL_CACHE.get(url)
+        if cached is not None:
+            URL_CACHE.move_to_end(url)
+        return cached
+
+def _cache_put(url, path, resized):
+    """Guarda una URL procesada en la caché, descartando las menos usadas si se supera el límite"""
+    global _url_cache_bytes
+    with _url_cache_lock:
+        if url in URL_CACHE:
+            return
+        URL_CACHE[url] = (path, resized)
+        _url_cache_bytes += len(resized)
+        while _url_cache_bytes > URL_CACHE_MAX_BYTES and URL_CACHE:
+            _, (_, evicted) = URL_CACHE.popitem(last=False)
+            _url_cache_bytes -= len(evicted)
+
+def _process_url(url, row, col, dest_dir):
+    """Descarga una imagen en la carpeta del informe y la redimensiona en el mismo hilo"""
+    cached = _cache_get(url)
+    if cached is not None:
+        # URL repetida: reutilizar la miniatura y copiar el original sin volver a descargarlo
+        source_path, resized = cached
+        path = os.path.join(dest_dir, f'{row}_{col}{os.path.splitext(source_path)[1]}')
+        try:
+            shutil.copyfile(source_path, path)
+            return True, {'filename': os.path.basename(path), 'resized': resized}
+        except OSError as e:
+            logger.debug(f"No se pudo reutilizar la imagen en caché {source_path}: {str(e)}")
+    
+    # Host limitado (HTTP 429): esperar una sola vez si el bloqueo es corto; si no, fallar sin pedir nada
+    wait = _host_wait(url)
+    if wait > MAX_RETRY_AFTER:
+        logger.error(f"HOST LIMITADO {row=} {col=} {url} - Bloqueado durante {wait:.0f} s más")
+        return False, None
+    if wait:
+        time.sleep(wait)
+    
+    with _host_semaphore(url):
+        success, path = download_image(url, row, col, dest_dir)
+    if not success:
+        return False, None
+    try:
+        with RESIZE_SEMAPHORE:
+            resized = resize_image(path)
+    except Exception as e:
+        logger.error(f'Error procesando imagen {row=} {col=} {url}: {str(e)}')
+        # Ningún informe enlaza la imagen: no dejarla en la carpeta publicada
+        if os.path.exists(path):
+            os.remove(path)
+        return False, None
+    _cache_put(url, path, resized)
+    return True, {'filename': os.path.basename(path), 'resized': resized}
+
+def _warm_up_connections(urls):
+    """Abre una conexión por host antes de las descargas para resolver DNS y completar el handshake una sola vez"""
+    hosts = {(parsed.scheme, parsed.netloc) for parsed in map(urlparse, urls)} - _warm_hosts
+    if not hosts:
+        return
+    _warm_hosts.update(hosts)
+    
+    def warm_up(scheme, host):
+        try:
+            request = SESSION.prepare_request(requests.Request('HEAD', f'{scheme}://{host}/'))
+            _warm_up_adapter.send(request, timeout=5).close()
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error de red al descargar imagen {row=} {col=} {url}: {str(e)}")
-            if attempt == max_retries - 1:
-                return False, None
-            continue
-        except Exception as e:
-            logger.error(f"Error inesperado al descargar imagen {row=} {col=} {url}: {str(e)}")
-            return False, None
+            logger.debug(f"No se pudo precalentar la conexión con {host}: {str(e)}")
+    
+    futures = [DOWNLOAD_EXECUTOR.submit(warm_up, scheme, host) for scheme, host in hosts]
+    concurrent.futures.wait(futures)
 
-def download_images(sheet):
-    """Descarga imágenes desde URLs en columnas 24-29 usando descargas paralelas."""
+def download_images(rows, img_dir):
+    """Descarga en img_dir y redimensiona imágenes desde URLs en columnas 24-29 usando descargas paralelas."""
     download_tasks = []
-    for row_index, row in enumerate(list(sheet.rows)[1:], 2):
-        for col in range(24, 30):
-            value = row[col].value
+    # Recorrer las filas sin copiar la lista y leyendo solo las columnas de imágenes
+    for row_index, row in enumerate(itertools.islice(rows, 1, None), 2):
+        for col, value in enumerate(row[IMAGE_COLUMNS.start:IMAGE_COLUMNS.stop], IMAGE_COLUMNS.start):
             if value and isinstance(value, str) and value.startswith('http'):
                 download_tasks.append((value, row_index, col))
     
@@ -145,94 +368,96 @@ def download_images(sheet):
         logger.warning("No se encontraron URLs válidas para descargar")
         return {}
     
+    # Solo hace falta precalentar los hosts de las URLs que no están ya en caché
+    _warm_up_connections(url for url, _, _ in download_tasks if url not in URL_CACHE)
+    
     completed = 0
     successful = 0
-    images_base64 = {}  # Diccionario para almacenar imágenes en base64
+    # Por imagen, con clave (fila, columna): nombre del archivo descargado y bytes redimensionados para el Excel
+    images = {}
     
     with tqdm(total=len(download_tasks), desc="Descargando imágenes") as pbar:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_task = {
-                executor.submit(download_image, url, row, col): (url, row, col)
-                for url, row, col in download_tasks
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_task):
-                url, row, col = future_to_task[future]
-                try:
-                    success, img_base64 = future.result()
-                    if success:  # Si la descarga fue exitosa
-                        successful += 1
-                        images_base64[f"{row}_{col}"] = img_base64
-                except Exception as e:
-                    logger.error(f"Error al descargar imagen en fila {row}, columna {col}: {e}")
-                completed += 1
-                pbar.set_postfix({'Exitosas': successful})
-                pbar.update(1)
+        future_to_task = {
+            DOWNLOAD_EXECUTOR.submit(_process_url, url, row, col, img_dir): (url, row, col)
+            for url, row, col in download_tasks
+        }
+        
+        for future in concurrent.futures.as_completed(future_to_task):
+            url, row, col = future_to_task[future]
+            try:
+                success, image = future.result()
+                if success:  # Si la descarga fue exitosa
+                    successful += 1
+                    images[(row, col)] = image
+            except Exception as e:
+                logger.error(f"Error al descargar imagen en fila {row}, columna {col}: {e}")
+            completed += 1
+            pbar.set_postfix({'Exitosas': successful})
+            pbar.update(1)
     
     logger.info(f"Descarga completada: {successful} de {len(download_tasks)} imágenes descargadas exitosamente")
-    return images_base64
+    return images
 
-def add_images(sheet, filename):
-    """Añade imágenes al archivo Excel"""
-    for col in sheet.columns:
-        sheet.column_dimensions[col[0].column_letter].width = 50
-    for row in list(sheet.rows)[1:]:
-        sheet.row_dimensions[row[0].row].height = 245
+def add_images(rows, images, filename):
+    """Escribe las filas y añade las imágenes al archivo Excel"""
+    workbook, sheet = create_sheet(filename, streaming=len(rows) > STREAMING_ROWS_THRESHOLD)
+    # El formato de filas y columnas va antes de los datos: en modo streaming cada fila se vuelca al escribirla
+    if rows:
+        sheet.set_column(0, len(rows[0]) - 1, 50)
+    
+    for row_index, row in enumerate(rows):
+        # Solo las filas de datos se agrandan para las imágenes; la cabecera conserva la altura estándar
+        if row_index:
+            sheet.set_row(row_index, 245)
+        sheet.write_row(row_index, 0, row)
 
-    images = glob.glob(f'{PROCESSED_DIR}/*')
     logger.info(f"Añadiendo {len(images)} imágenes al Excel")
     
     with tqdm(total=len(images), desc="Insertando imágenes") as pbar:
-        for path in images:
+        for (row, col), image in images.items():
             try:
-                filename_parts = os.path.basename(path).split('.')[0].split('_')
-                if len(filename_parts) == 2:
-                    row, col = filename_parts
-                    img = ExcelImage(path)
-                    sheet.add_image(img, f'{COLUMN_MAP[col]}{row}')
+                sheet.insert_image(f'{IMAGE_COLUMN_LETTERS[col]}{row}', image['filename'],
+                                   {'image_data': io.BytesIO(image['resized'])})
             except Exception as e:
-                logger.error(f'Error insertando imagen {path}: {str(e)}')
+                logger.error(f'Error insertando imagen {row=} {col=}: {str(e)}')
             pbar.update(1)
-    sheet.parent.save(filename)
+    workbook.close()
 
-def create_sheet():
-    """Crea una nueva hoja de cálculo"""
-    wb = openpyxl.Workbook()
-    wb.create_sheet('Export')
-    del wb['Sheet']
-    return wb['Export']
+def create_sheet(filename, streaming=False):
+    """Crea un nuevo libro de Excel con la hoja 'Export' (en modo streaming para hojas grandes)"""
+    workbook = xlsxwriter.Workbook(filename, {
+        # in_memory es más rápido para hojas pequeñas; constant_memory vuelca cada fila a disco
+        # al escribirla y mantiene la memoria constante (xlsxwriter ignora constant_memory con in_memory)
+        'in_memory': not streaming,
+        'constant_memory': streaming,
+        # Texto tal cual: con fórmulas o URLs, extract_report_data (data_only) no leería el valor original
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+        'default_date_format': 'dd/mm/yyyy hh:mm',
+    })
+    return workbook, workbook.add_worksheet('Export')
 
 def filter_cobertura(sheet):
-    """Filtra datos por columna de cobertura"""
-    sheets = {}
-    header = None
-    for row in sheet.iter_rows(values_only=True):
-        if not header:
-            header = row
-            continue
+    """Filtra datos por columna de cobertura (cada grupo incluye la cabecera como primera fila)"""
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return {}
+    
+    # Cada grupo nuevo empieza con la cabecera; una sola búsqueda en el diccionario por fila.
+    # La clave se normaliza a texto: 101 y '101' dan los mismos nombres de archivo y deben ser un solo grupo
+    groups = defaultdict(lambda: [header])
+    for row in rows:
         if row[1]:
-            if row[1] not in sheets:
-                new_sheet = create_sheet()
-                new_sheet.append(header)
-                sheets[row[1]] = new_sheet
-            sheets[row[1]].append(row)
-    return sheets
-
-def get_image_base64(url):
-    """Convierte imagen a base64"""
-    try:
-        response = requests.get(url, timeout=10)
-        if response.ok and response.headers.get('content-type', '').startswith('image/'):
-            return base64.b64encode(response.content).decode('utf-8')
-        return None
-    except Exception as e:
-        print(f'Error obteniendo imagen {url}: {str(e)}')
-        return None
+            groups[str(row[1])].append(row)
+    return dict(groups)
 
-def extract_report_data(excel_file, images_base64):
+def extract_report_data(excel_file, images):
     """Extrae datos para el reporte"""
+    wb = None
     try:
-        wb = openpyxl.load_workbook(excel_file)
+        # Modo de solo lectura: lector en streaming, sin estilos ni fórmulas
+        wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
         report_data = {
             'filename': os.path.basename(excel_file),
             'sections': []
@@ -240,34 +465,33 @@ def extract_report_data(excel_file, images_base64):
         
         for sheet_name in wb.sheetnames:
             sheet = wb[sheet_name]
-            headers = [cell.value for cell in sheet[1]] if sheet.max_row > 0 else []
+            rows = sheet.iter_rows(values_only=True)
+            headers = list(next(rows, ()))
+            # Precalcular por columna si se incluye en el informe
+            include_mask = [header not in EXCLUDED_COLUMNS for header in headers]
             section_data = {
                 'title': sheet_name,
                 'entries': []
             }
             
-            for row in sheet.iter_rows(min_row=2):
+            for row_index, values in enumerate(rows, 2):
                 entry = {}
-                images = []
+                entry_images = []
                 
-                for idx, cell in enumerate(row):
-                    if idx >= len(headers):
+                for idx, value in enumerate(values[:len(headers)]):
+                    if not include_mask[idx]:
                         continue
                     header = headers[idx]
-                    value = cell.value
                     
-                    # Excluir columnas específicas
-                    if header in ['Conca-1', 'Total Horas', 'Recorridospedestres', 'Recuento de Combinada']:
-                        continue
-                    
-                    if (cell.column in range(24, 30) and value and 
+                    if (idx in IMAGE_COLUMNS and value and 
                         isinstance(value, str) and value.startswith('http')):
-                        img_key = f"{cell.row}_{cell.column}"
-                        if img_key in images_base64:
-                            images.append({
+                        # Misma clave (fila, columna base 0) que usa download_images
+                        image = images.get((row_index, idx))
+                        if image:
+                            entry_images.append({
                                 'title': header,
-                                'data': images_base64[img_key],
-                                'position': f'Columna {cell.column_letter}'
+                                'filename': image['filename'],
+                                'position': f'Columna {IMAGE_COLUMN_LETTERS[idx]}'
                             })
                     else:
                         entry[header] = value
@@ -275,7 +499,7 @@ def extract_report_data(excel_file, images_base64):
                 if entry:
                     section_data['entries'].append({
                         'data': entry,
-                        'images': images
+                        'images': entry_images
                     })
             
             report_data['sections'].append(section_data)
@@ -284,425 +508,33 @@ def extract_report_data(excel_file, images_base64):
     except Exception as e:
         print(f"Error procesando archivo {excel_file}: {str(e)}")
         return None
+    finally:
+        # En modo de solo lectura el archivo queda abierto hasta cerrar el libro
+        if wb is not None:
+            wb.close()
 
-def generate_html_report(data, html_folder, cobertura):
-    """Genera reporte HTML con visor modal de imágenes para una cobertura específica"""
-    if not data:
-        return
-    
-    html_content = f"""
+# Esqueleto del informe HTML: cabecera (con marcadores) y cierre; las secciones se escriben entre ambos
+_REPORT_HEAD = Template("""
 <!DOCTYPE html>
 <html lang="es">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Informe de Hallazgos - {cobertura}</title>
+    <title>Informe de Hallazgos - ${cobertura}</title>
     <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&display=swap" rel="stylesheet">
     <style>
-        :root {{
-            --color-background: #E0F0FF;
-            --color-title: #003B5C;
-            --color-subtitle: #0077B3;
-            --color-card: #A4C8E1;
-            --color-card-secondary: #dedede;
-            --color-button: #005A8D;
-            --shadow-sm: 0 2px 4px rgba(0,0,0,0.1);
-            --shadow-md: 0 4px 6px rgba(0,0,0,0.1);
-            --shadow-lg: 0 10px 15px rgba(0,0,0,0.1);
-            --border-radius: 8px;
-            --spacing-xs: 0.25rem;
-            --spacing-sm: 0.5rem;
-            --spacing-md: 0.75rem;
-            --spacing-lg: 2.5rem;
-            --spacing-xl: 1.5rem;
-        }}
-        
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        body {{
-            font-family: 'Roboto', sans-serif;
-            line-height: 1.4;
-            color: var(--color-title);
-            background-color: var(--color-background);
-            padding: var(--spacing-sm);
-        }}
-        
-        .report-container {{
-            max-width: 1400px;
-            margin: 0 auto;
-            background: white;
-            border-radius: var(--border-radius);
-            box-shadow: var(--shadow-lg);
-            overflow: hidden;
-        }}
-        
-        header {{
-            background: var(--color-title);
-            color: white;
-            padding: var(--spacing-md);
-            text-align: center;
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        header::before {{
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: linear-gradient(45deg, var(--color-title), var(--color-subtitle));
-            opacity: 0.9;
-            z-index: 0;
-        }}
-        
-        header h1 {{
-            font-size: 1.8rem;
-            margin-bottom: var(--spacing-xs);
-            position: relative;
-            z-index: 1;
-        }}
-        
-        header p {{
-            color: rgba(255, 255, 255, 0.9);
-            font-size: 0.9rem;
-            position: relative;
-            z-index: 1;
-        }}
-        
-        .report-section {{
-            padding: var(--spacing-md);
-            border-bottom: 1px solid rgba(0, 0, 0, 0.1);
-        }}
-        
-        .report-section:last-child {{
-            border-bottom: none;
-        }}
-        
-        .report-section h3 {{
-            color: var(--color-subtitle);
-            font-size: 1.2rem;
-            margin-bottom: var(--spacing-md);
-            padding-bottom: var(--spacing-xs);
-            border-bottom: 2px solid var(--color-subtitle);
-        }}
-        
-        .entry {{
-            background: var(--color-card-secondary);
-            border-radius: var(--border-radius);
-            margin-bottom: var(--spacing-xl);
-            overflow: hidden;
-            box-shadow: var(--shadow-sm);
-            padding: var(--spacing-md);
-        }}
-        
-        .entry:last-child {{
-            margin-bottom: 0;
-        }}
-        
-        .entry-divider {{
-            height: 2px;
-            background: linear-gradient(to right, transparent, var(--color-subtitle), transparent);
-            margin: var(--spacing-lg) 0;
-            opacity: 0.5;
-        }}
-        
-        .data-flex {{
-            display: flex;
-            flex-wrap: wrap;
-            gap: var(--spacing-md);
-            margin-bottom: var(--spacing-md);
-        }}
-        
-        .data-item {{
-            flex: 1 1 300px;
-            min-width: 300px;
-            background: white;
-            padding: var(--spacing-sm);
-            border-radius: var(--border-radius);
-            transition: transform 0.2s ease;
-        }}
-        
-        .data-item:hover {{
-            transform: translateY(-2px);
-        }}
-        
-        .data-item-label {{
-            font-size: 0.75rem;
-            color: var(--color-subtitle);
-            margin-bottom: var(--spacing-xs);
-            font-weight: 500;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-        }}
-        
-        .data-item-value {{
-            font-size: 0.85rem;
-            color: var(--color-title);
-            word-break: break-word;
-        }}
-        
-        .data-item-full {{
-            flex: 1 1 100%;
-            background: linear-gradient(to right, white, var(--color-background));
-        }}
-        
-        .image-gallery {{
-            display: flex;
-            flex-wrap: wrap;
-            gap: var(--spacing-md);
-            margin-top: var(--spacing-md);
-            padding: var(--spacing-sm);
-        }}
-        
-        .image-item {{
-            flex: 1 1 250px;
-            min-width: 250px;
-            background: white;
-            border-radius: var(--border-radius);
-            overflow: hidden;
-            box-shadow: var(--shadow-sm);
-            transition: transform 0.2s ease;
-        }}
-        
-        .image-item:hover {{
-            transform: translateY(-3px);
-            box-shadow: var(--shadow-md);
-        }}
-        
-        .image-container {{
-            height: 200px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            background: var(--color-background);
-            cursor: pointer;
-            position: relative;
-            overflow: hidden;
-        }}
-        
-        .image-container::after {{
-            content: '🔍';
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            transform: translate(-50%, -50%);
-            font-size: 1.2rem;
-            opacity: 0;
-            transition: opacity 0.3s ease;
-            background: rgba(0, 0, 0, 0.5);
-            width: 100%;
-            height: 100%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-        }}
-        
-        .image-container:hover::after {{
-            opacity: 1;
-        }}
-        
-        .image-container img {{
-            max-width: 100%;
-            max-height: 100%;
-            object-fit: contain;
-        }}
-        
-        .image-caption {{
-            padding: var(--spacing-sm);
-            background: white;
-            font-size: 0.8rem;
-            color: var(--color-subtitle);
-            text-align: center;
-        }}
-        
-        /* Modal styles */
-        .modal {{
-            display: none;
-            position: fixed;
-            z-index: 1000;
-            left: 0;
-            top: 0;
-            width: 100%;
-            height: 100%;
-            background: rgba(0, 0, 0, 0.9);
-            backdrop-filter: blur(5px);
-        }}
-        
-        .modal-content {{
-            display: block;
-            max-width: 90%;
-            max-height: 90%;
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            transform: translate(-50%, -50%);
-            border-radius: var(--border-radius);
-            box-shadow: var(--shadow-lg);
-        }}
-        
-        .close {{
-            position: absolute;
-            top: 20px;
-            right: 30px;
-            color: white;
-            font-size: 40px;
-            font-weight: bold;
-            cursor: pointer;
-            transition: color 0.3s ease;
-        }}
-        
-        .close:hover {{
-            color: var(--color-button);
-        }}
-        
-        /* Responsive Design */
-        @media (max-width: 1200px) {{
-            .data-item {{
-                flex: 1 1 250px;
-                min-width: 250px;
-            }}
-        }}
-        
-        @media (max-width: 992px) {{
-            .data-item {{
-                flex: 1 1 200px;
-                min-width: 200px;
-            }}
-            
-            .image-item {{
-                flex: 1 1 200px;
-                min-width: 200px;
-            }}
-            
-            .image-container {{
-                height: 180px;
-            }}
-        }}
-        
-        @media (max-width: 768px) {{
-            body {{
-                padding: var(--spacing-xs);
-            }}
-            
-            .report-container {{
-                border-radius: 0;
-            }}
-            
-            header h1 {{
-                font-size: 1.5rem;
-            }}
-            
-            .report-section h3 {{
-                font-size: 1.1rem;
-            }}
-            
-            .entry {{
-                margin-bottom: var(--spacing-lg);
-                padding: var(--spacing-sm);
-            }}
-            
-            .data-item,
-            .image-item {{
-                flex: 1 1 30%;
-                min-width: 48%;
-            }}
-            
-            .image-container {{
-                height: 150px;
-            }}
-        }}
-        
-        @media (max-width: 480px) {{
-            header h1 {{
-                font-size: 1.3rem;
-            }}
-            
-            header p {{
-                font-size: 0.8rem;
-            }}
-            
-            .report-section h3 {{
-                font-size: 1rem;
-            }}
-            
-            .data-item-label {{
-                font-size: 0.7rem;
-            }}
-            
-            .data-item-value {{
-                font-size: 0.8rem;
-            }}
-            
-            .image-container {{
-                height: 200px;
-            }}
-        }}
+${css}
     </style>
 </head>
 <body>
     <div class="report-container">
         <header>
             <h1>Informe de Hallazgos</h1>
-            <p>{cobertura} - Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')}</p>
+            <p>${cobertura} - Generado el ${timestamp}</p>
         </header>
-"""
+""")
 
-    for section in data['sections']:
-        html_content += f"""
-        <div class="report-section">
-            <h3>{section['title']}</h3>"""
-        
-        for entry in section['entries']:
-            html_content += """
-            <div class="entry">
-                <div class="data-flex">"""
-            
-            # Lista de campos que deberían ocupar todo el ancho
-            full_width_fields = ['ObservacionesHallazgo']
-            
-            for key, value in entry['data'].items():
-                if value and str(value).strip():
-                    css_class = 'data-item-full' if key in full_width_fields else ''
-                    html_content += f"""
-                    <div class="data-item {css_class}">
-                        <div class="data-item-label">{key}</div>
-                        <div class="data-item-value">{value}</div>
-                    </div>"""
-            
-            html_content += """
-                </div>"""
-            
-            if entry['images']:
-                html_content += """
-                <div class="image-gallery">"""
-                for img in entry['images']:
-                    html_content += f"""
-                    <div class="image-item">
-                        <div class="image-container" onclick="openModal('data:image/png;base64,{img['data']}')">
-                            <img src="data:image/png;base64,{img['data']}" alt="{img['title']}">
-                        </div>
-                        <div class="image-caption">
-                            {img['title']} ({img['position']})
-                        </div>
-                    </div>"""
-                html_content += """
-                </div>"""
-        
-            html_content += """
-            </div>"""
-            html_content += """
-            <div class="entry-divider"></div>"""
-        html_content += """
-        </div>"""
-    
-    html_content += """
+_REPORT_TAIL = """
         <!-- Modal para imágenes -->
         <div id="imageModal" class="modal">
             <span class="close" onclick="closeModal()">&times;</span>
@@ -737,128 +569,241 @@ def generate_html_report(data, html_folder, cobertura):
 </body>
 </html>"""
 
+# Fragmentos HTML reutilizados en cada sección, entrada e imagen del informe
+_SECTION_TPL = """
+        <div class="report-section">
+            <h3>{title}</h3>"""
+
+_DATA_ITEM_TPL = """
+                    <div class="data-item {cls}">
+                        <div class="data-item-label">{k}</div>
+                        <div class="data-item-value">{v}</div>
+                    </div>"""
+
+_IMAGE_ITEM_TPL = """
+                    <div class="image-item">
+                        <div class="image-container" onclick="openModal(this.querySelector('img').dataset.full)">
+                            <img src="{src}" data-full="{src}" alt="{title}" loading="lazy">
+                        </div>
+                        <div class="image-caption">
+                            {title} ({position})
+                        </div>
+                    </div>"""
+
+def report_image_dir(html_folder, cobertura):
+    """Crea vacía y devuelve la carpeta donde se guardan las imágenes del informe de una cobertura"""
+    img_dir = os.path.join(html_folder, 'img', str(cobertura))
+    # Vaciarla para no dejar imágenes de ejecuciones anteriores (p. ej. con otra extensión)
+    shutil.rmtree(img_dir, ignore_errors=True)
+    os.makedirs(img_dir, exist_ok=True)
+    return img_dir
+
+def generate_html_report(data, html_folder, cobertura):
+    """Genera reporte HTML con visor modal de imágenes para una cobertura específica"""
+    if not data:
+        return
+    
+    # Las imágenes ya se descargaron junto al informe (ver report_image_dir); se referencian por ruta relativa
+    # La cobertura puede llegar como número desde la hoja Export
+    img_url_prefix = f"img/{quote(str(cobertura))}"
+
     report_filename = os.path.join(html_folder, f"informe_{cobertura}.html")
-    with open(report_filename, "w", encoding="utf-8") as f:
-        f.write(html_content)
+    # Se escribe el informe por partes sobre un único archivo con buffer, sin construir la cadena completa
+    with open(report_filename, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write(_REPORT_HEAD.substitute(
+            cobertura=html.escape(str(cobertura)),
+            timestamp=datetime.now().strftime('%d/%m/%Y a las %H:%M'),
+            css=_CSS,
+        ))
+        for section in data['sections']:
+            f.write(_SECTION_TPL.format(title=html.escape(str(section['title']))))
+    
+            for entry in section['entries']:
+                f.write("""
+            <div class="entry">
+                <div class="data-flex">""")
+        
+                for key, value in entry['data'].items():
+                    if value and str(value).strip():
+                        css_class = 'data-item-full' if key in FULL_WIDTH_FIELDS else ''
+                        f.write(_DATA_ITEM_TPL.format(cls=css_class, k=html.escape(str(key)), v=html.escape(str(value))))
+        
+                f.write("""
+                </div>""")
+        
+                if entry['images']:
+                    f.write("""
+                <div class="image-gallery">""")
+                    for img in entry['images']:
+                        img_src = f"{img_url_prefix}/{quote(img['filename'])}"
+                        f.write(_IMAGE_ITEM_TPL.format(
+                            src=html.escape(img_src),
+                            title=html.escape(str(img['title'])),
+                            position=html.escape(img['position']),
+                        ))
+                    f.write("""
+                </div>""")
+    
+                f.write("""
+            </div>""")
+                f.write("""
+            <div class="entry-divider"></div>""")
+            f.write("""
+        </div>""")
+        f.write(_REPORT_TAIL)
     
     print(f"\n✅ Informe generado: {report_filename}")
 
 def clean_temp_files():
-    """Elimina los archivos y carpetas temporales, dejando solo la carpeta de output"""
-    temp_folders = [DOWNLOAD_DIR, PROCESSED_DIR, 'temp_images']
-    total_files = 0
+    """Elimina las carpetas temporales, dejando solo la carpeta de output"""
+    temp_folders = ['temp_images']
     
-    # Primero contar todos los archivos
     for folder in temp_folders:
         if os.path.exists(folder):
-            files = glob.glob(f'{folder}/*')
-            total_files += len(files)
+            shutil.rmtree(folder, ignore_errors=True)
+            logger.info(f'✅ Carpeta temporal eliminada: {folder}')
     
-    if total_files == 0:
-        logger.info('✅ No hay archivos temporales para limpiar')
-        return
+    logger.info('✅ Limpieza completada')
+
+def open_folder(folder):
+    """Abre una carpeta con el explorador de archivos del sistema; si no es posible, solo avisa"""
+    try:
+        if sys.platform == 'win32':
+            os.startfile(folder)
+        elif sys.platform == 'darwin':
+            subprocess.Popen(['open', folder])
+        else:
+            subprocess.Popen(['xdg-open', folder])
+        logger.info(f"📂 Abriendo carpeta de resultados: {folder}")
+    except OSError as e:
+        logger.warning(f"⚠️ No se pudo abrir la carpeta de resultados {folder}: {str(e)}")
+
+def validate_file_path(file_path):
+    """Comprueba que la ruta apunte a un archivo .xlsx existente"""
+    if not file_path:
+        logger.error("❌ No se proporcionó ninguna ruta")
+        return False
+    if not os.path.exists(file_path):
+        logger.error(f"❌ El archivo no existe: {file_path}")
+        return False
+    if not file_path.lower().endswith('.xlsx'):
+        logger.error("❌ El archivo debe tener extensión .xlsx")
+        return False
+    return True
+
+def output_names(files):
+    """Devuelve el nombre de la subcarpeta de salida de cada archivo: su nombre sin extensión, con sufijo si se repite"""
+    names = []
+    for file_path in files:
+        stem = name = os.path.splitext(os.path.basename(file_path))[0]
+        suffix = 2
+        while name in names:
+            name = f'{stem}_{suffix}'
+            suffix += 1
+        names.append(name)
+    return names
+
+def ask_file_path():
+    """Solicita la ruta del archivo Excel hasta recibir una válida"""
+    while True:
+        file_path = input("Por favor, ingrese la ruta completa del archivo Excel: ").strip()
+        if validate_file_path(file_path):
+            return file_path
+
+def process_file(file_path, excel_folder, html_folder):
+    """Genera los Excel con imágenes y los reportes HTML de cada cobertura de un archivo"""
+    # El archivo de origen solo se lee: cargarlo en modo streaming
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    logger.info(f"📂 Archivo cargado: {file_path}")
     
-    logger.info(f'🧹 Limpiando {total_files} archivos temporales...')
-    processed_files = 0
+    try:
+        sheets = filter_cobertura(wb['Export'])
+    finally:
+        wb.close()
+    output_files = []
     
-    with tqdm(total=total_files, desc="Limpiando archivos temporales") as pbar:
-        for folder in temp_folders:
-            try:
-                if os.path.exists(folder):
-                    files = glob.glob(f'{folder}/*')
-                    for file in files:
-                        try:
-                            os.remove(file)
-                            processed_files += 1
-                        except Exception as e:
-                            logger.error(f'Error eliminando archivo {file}: {str(e)}')
-                        pbar.update(1)
-                    try:
-                        os.rmdir(folder)
-                        logger.info(f'✅ Carpeta temporal eliminada: {folder}')
-                    except Exception as e:
-                        logger.error(f'Error eliminando carpeta {folder}: {str(e)}')
-            except Exception as e:
-                logger.error(f'Error limpiando carpeta {folder}: {str(e)}')
+    with tqdm(total=len(sheets), desc="Procesando coberturas") as pbar:
+        for position, (cobertura, rows) in enumerate(sheets.items(), 1):
+            logger.info(f"\n🔄 Procesando: {cobertura}")
+            # Descargar las imágenes junto al informe HTML y redimensionarlas para el Excel
+            images = download_images(rows, report_image_dir(html_folder, cobertura))
+            
+            output_filename = os.path.join(excel_folder, f'{cobertura}.xlsx')
+            logger.info(f"💾 Guardando: {output_filename}")
+            add_images(rows, images, output_filename)
+            # Las miniaturas ya están dentro del Excel; el informe HTML solo necesita los archivos originales
+            for image in images.values():
+                del image['resized']
+            output_files.append((output_filename, cobertura, images))
+            
+            # Esperar entre coberturas (no tras la última) solo si el servidor limitó las peticiones (HTTP 429) recientemente
+            if (position < len(sheets) and _last_throttled_at is not None
+                    and time.monotonic() - _last_throttled_at < THROTTLE_WINDOW):
+                wait_time = 5  # tiempo en segundos
+                logger.info(f"⏳ Esperando {wait_time:.1f} segundos antes de procesar la siguiente cobertura...")
+                time.sleep(wait_time)
+            
+            pbar.update(1)
     
-    logger.info(f'✅ Limpieza completada: {processed_files} de {total_files} archivos eliminados')
+    logger.info(f"\n✅ Proceso completado exitosamente: {file_path}")
+    
+    # Generar reportes HTML
+    if output_files:
+        logger.info("📊 Generando reportes HTML...")
+        with tqdm(total=len(output_files), desc="Generando reportes HTML") as pbar:
+            for excel_file, cobertura, images in output_files:
+                data = extract_report_data(excel_file, images)
+                if data:
+                    generate_html_report(data, html_folder, cobertura)
+                pbar.update(1)
 
 def main():
     """Función principal"""
+    parser = argparse.ArgumentParser(description="Genera Excel con imágenes y reportes HTML por cobertura")
+    parser.add_argument('files', nargs='*', help="Archivos Excel (.xlsx) a procesar")
+    args = parser.parse_args()
+    
+    # Sin argumentos, pedir la ruta solo si hay una terminal interactiva
+    if args.files:
+        files = [f for f in args.files if validate_file_path(f)]
+        if not files:
+            sys.exit(1)
+    elif sys.stdin.isatty():
+        files = [ask_file_path()]
+    else:
+        parser.error("indique al menos un archivo Excel")
+    
     excel_folder, html_folder = setup_folders()
     
     try:
-        # Solicitar la ruta del archivo Excel
-        while True:
-            file_path = input("Por favor, ingrese la ruta completa del archivo Excel: ").strip()
-            if not file_path:
-                logger.error("❌ No se proporcionó ninguna ruta")
-                continue
-            if not os.path.exists(file_path):
-                logger.error(f"❌ El archivo no existe: {file_path}")
-                continue
-            if not file_path.lower().endswith('.xlsx'):
-                logger.error("❌ El archivo debe tener extensión .xlsx")
-                continue
-            break
-
-        wb = openpyxl.load_workbook(file_path)
-        logger.info(f"📂 Archivo cargado: {file_path}")
-        
-        sheet = wb['Export']
-        sheets = filter_cobertura(sheet)
-        output_files = []
-        
-        with tqdm(total=len(sheets), desc="Procesando coberturas") as pbar:
-            for cobertura, sheet in sheets.items():
-                logger.info(f"\n🔄 Procesando: {cobertura}")
-                empty_folder(DOWNLOAD_DIR)
-                empty_folder(PROCESSED_DIR)
-                
-                # Descargar imágenes y obtener base64
-                images_base64 = download_images(sheet)
-                process_images()
-                
-                output_filename = os.path.join(excel_folder, f'{cobertura}.xlsx')
-                logger.info(f"💾 Guardando: {output_filename}")
-                add_images(sheet, output_filename)
-                output_files.append((output_filename, cobertura, images_base64))
-                
-                # Espera aleatoria entre coberturas
-                if len(sheets) > 1:  # Solo esperar si hay más de una cobertura
-                    base_wait = 5  # tiempo base en segundos
-                    max_wait = 12  # tiempo máximo en segundos
-                    wait_time = min(base_wait * (1.5 ** (len(output_files) - 1)), max_wait)
-                    wait_time = random.uniform(wait_time * 0.8, wait_time)  # Variación aleatoria
-                    logger.info(f"⏳ Esperando {wait_time:.1f} segundos antes de procesar la siguiente cobertura...")
-                    time.sleep(wait_time)
-                
-                pbar.update(1)
-        
-        logger.info("\n✅ Proceso completado exitosamente")
-        
-        # Generar reportes HTML
-        if output_files:
-            logger.info("📊 Generando reportes HTML...")
-            with tqdm(total=len(output_files), desc="Generando reportes HTML") as pbar:
-                for excel_file, cobertura, images_base64 in output_files:
-                    data = extract_report_data(excel_file, images_base64)
-                    if data:
-                        generate_html_report(data, html_folder, cobertura)
-                    pbar.update(1)
+        # Los archivos suelen repetir coberturas: con varios, cada uno escribe en su propia subcarpeta
+        # para no sobrescribir los Excel, informes e imágenes de los anteriores
+        if len(files) > 1:
+            targets = [(os.path.join(excel_folder, name), os.path.join(html_folder, name))
+                       for name in output_names(files)]
+        else:
+            targets = [(excel_folder, html_folder)]
+        
+        # Los archivos comparten sesión, pool de descargas y URL_CACHE
+        for file_path, (file_excel_folder, file_html_folder) in zip(files, targets):
+            os.makedirs(file_excel_folder, exist_ok=True)
+            os.makedirs(file_html_folder, exist_ok=True)
+            process_file(file_path, file_excel_folder, file_html_folder)
         
         # Limpiar archivos temporales
         logger.info("\n🧹 Limpiando archivos temporales...")
         clean_temp_files()
         
-        # Abrir la carpeta de resultados
-        main_folder = os.path.dirname(excel_folder)
-        subprocess.Popen(f'explorer "{main_folder}"')
-        logger.info(f"📂 Abriendo carpeta de resultados: {main_folder}")
+        # Abrir la carpeta de resultados solo en sesiones interactivas
+        if sys.stdin.isatty():
+            open_folder(os.path.dirname(excel_folder))
         
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
         sys.exit(1)
+    finally:
+        DOWNLOAD_EXECUTOR.shutdown()
+        SESSION.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file